@@ -1,92 +1,663 @@
 import streamlit as st
 import os
+import hashlib
+import json
+import asyncio
+import threading
+import tiktoken
+from openai import OpenAI
 from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.chains import LLMChain
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
 from dotenv import load_dotenv
 
+try:
+    # 可选依赖：安装 xxhash 后用更快的非加密哈希计算缓存键
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    # 可选依赖：安装 diskcache 后响应缓存持久化到磁盘
+    import diskcache
+except ImportError:
+    diskcache = None
+
+try:
+    # 可选依赖：安装 llmlingua 后才启用长对话压缩
+    from llmlingua import PromptCompressor
+except ImportError:
+    PromptCompressor = None
+
 # --- 1. 环境设置与加载 ---
-# 从 .env 文件加载环境变量 (OPENAI_API_KEY)
-load_dotenv()
+@st.cache_resource(show_spinner=False)
+def _ensure_env():
+    """
+    从 .env 文件加载环境变量 (OPENAI_API_KEY)，并返回 API Key。
+
+    Streamlit 每次交互都会重新执行整个脚本，模块顶层的 load_dotenv() 也会随之反复读取 .env，
+    这里借助 st.cache_resource 让每个进程只加载一次。
+    """
+    load_dotenv()
+    return os.getenv("OPENAI_API_KEY")
+
 
 def check_api_key():
     """检查 OpenAI API Key 是否已设置"""
-    if not os.getenv("OPENAI_API_KEY"):
+    if not _ensure_env():
+        # 不缓存"未设置"的结果，补上 .env 后下一次重跑即可重新读取
+        _ensure_env.clear()
         st.error("OpenAI API Key 未设置！请在项目根目录下创建一个 .env 文件，并写入 OPENAI_API_KEY='sk-...'")
         st.stop()
 
 
 # --- 2. 核心 AI 逻辑 ---
-def generate_summary(dialogue_text: str) -> str:
+# 模型参数
+# temperature=0.1 使得输出更稳定、可复现
+MODEL_NAME = "gpt-4o-mini"
+TEMPERATURE = 0.1
+
+# 按输入长度路由模型：短对话用更便宜、更快的模型，超长对话用能力更强的模型
+SMALL_MODEL_NAME = "gpt-4.1-nano"
+LARGE_MODEL_NAME = "gpt-4o"
+SMALL_MODEL_MAX_TOKENS = 2_000
+DEFAULT_MODEL_MAX_TOKENS = 20_000
+
+# --- Prompt Template (提示词模板) ---
+# 这是整个项目的灵魂。我们通过这个模板精确地指导 LLM 如何行动。
+# 一个好的模板是高质量输出的保证。
+# 静态的指令部分放在 system 消息中、位于请求最前面，对话原文单独作为 user 消息，
+# 这样每次请求的公共前缀完全一致，可以命中 OpenAI 的自动 Prompt Caching。
+# 指令已去掉客套和重复的修饰语，只保留决定输出结构的要求，以减少每次请求的输入 token。
+SYSTEM_PROMPT = """
+你是资深项目经理兼技术架构师。分析用户提供的团队对话记录，输出事件复盘报告，须含以下部分：
+
+### 1. 事件概述
+一句话概括事件核心。
+
+### 2. 问题时间线 (Timeline)
+按时间顺序列出关键节点的人物和行为：
+- **10:00 AM (小李):** 报告问题（附关键日志）。
+- **10:02~10:05 AM (老王):** 提出猜测，给出排查指令（如 `top`）。
+- **10:08 AM (小李):** 反馈执行结果（如 `top` 截图内容）。
+- **...直到问题解决。**
+
+### 3. 根本原因 (Root Cause Analysis)
+一句话指出技术根因。
+
+### 4. 解决方案
+最终技术方案及执行人。
+
+### 5. 总结与反思
+一句话提炼教训及改进措施。
+
+仅基于对话原文，不添加未提及的信息。Markdown 输出，不用代码块，用空格+斜体代替。
+"""
+
+HUMAN_PROMPT = "【对话记录原文】\n{dialogue}"
+
+# 模板版本号：由模板内容派生，修改提示词后响应缓存自动失效
+PROMPT_VERSION = hashlib.blake2b(
+    f"{SYSTEM_PROMPT}|{HUMAN_PROMPT}".encode("utf-8"), digest_size=8
+).hexdigest()
+
+
+@st.cache_resource(show_spinner=False)
+def get_llm(model_name: str):
+    """
+    为每个模型创建并缓存一个 ChatOpenAI 客户端。
+
+    Streamlit 每次交互都会重新执行整个脚本，这里借助 st.cache_resource
+    保证 ChatOpenAI 客户端（含其 HTTP 连接池）在进程内只创建一次。
     """
-    使用 LangChain 和大语言模型分析并总结对话。
+    return ChatOpenAI(temperature=TEMPERATURE, model_name=model_name)
+
+
+@st.cache_resource(show_spinner=False)
+def get_chain(model_name: str = MODEL_NAME):
+    """构建并缓存指定模型的 Prompt + LLM 链，模板只在首次调用时解析"""
+    # 创建 Prompt 模板实例
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT),
+        ("human", HUMAN_PROMPT),
+    ])
+
+    # 将 Prompt、LLM 和输出解析器 "链接" 在一起，链的输出直接是字符串
+    return prompt | get_llm(model_name) | StrOutputParser()
+
+
+# --- 输入长度控制 (tiktoken) ---
+# 对话超过该 token 数时省略中间部分，为 system 提示词和输出留出上下文空间
+MAX_INPUT_TOKENS = 120_000
+
+
+# 首次使用时需要联网下载 o200k_base 词表
+@st.cache_resource(show_spinner="正在加载 tiktoken 词表（首次使用需下载）...")
+def get_encoder():
+    """加载并缓存 tiktoken 编码器（路由到的各模型共用 o200k_base 编码，按默认模型加载即可）"""
+    return tiktoken.encoding_for_model(MODEL_NAME)
+
+
+def count_tokens(text: str) -> int | None:
+    """
+    在本地计算文本的 token 数，无需请求 API。
+
+    词表下载失败（如离线环境）时返回 None，调用方据此跳过计数相关的提示和路由，
+    页面和 API 调用仍可正常使用。
+    """
+    try:
+        encoder = get_encoder()
+    except Exception:
+        return None
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def pick_model_for(n_tokens: int | None) -> str:
+    """根据对话的 token 数选择模型（传入已算好的 token 数，避免重复编码长文本）"""
+    if n_tokens is None:
+        return MODEL_NAME
+    if n_tokens < SMALL_MODEL_MAX_TOKENS:
+        return SMALL_MODEL_NAME
+    if n_tokens < DEFAULT_MODEL_MAX_TOKENS:
+        return MODEL_NAME
+    return LARGE_MODEL_NAME
+
+
+def truncate_dialogue(dialogue_text: str, n_tokens: int | None) -> str:
+    """
+    超出上下文上限的对话保留开头和结尾各一半，省略中间部分。
+
+    开头和结尾通常包含问题的发现与解决，保留它们能让时间线首尾完整；
+    在本地截断可以避免请求发出后才因超长而失败。
 
     Args:
         dialogue_text: 包含对话记录的字符串。
+        n_tokens: 对话的 token 数，未超限时直接返回，无需再次编码；
+            为 None（无法计数）时原样返回。
 
     Returns:
-        由 AI 生成的 Markdown 格式的总结报告。
+        不超过 MAX_INPUT_TOKENS 的对话文本（另加一行省略标记）。
     """
-    # --- Prompt Template (提示词模板) ---
-    # 这是整个项目的灵魂。我们通过这个模板精确地指导 LLM 如何行动。
-    # 一个好的模板是高质量输出的保证。
-    prompt_template = """
-    你是一名顶级的项目经理和资深技术架构师。你的任务是专业、深入地分析以下团队对话记录。
-    请根据对话内容，以结构化、时间线清晰的格式，生成一份完整的事件复盘报告。
+    if n_tokens is None or n_tokens <= MAX_INPUT_TOKENS:
+        return dialogue_text
 
-    你的报告必须包含以下部分，并严格遵循要求：
+    encoder = get_encoder()
+    tokens = encoder.encode(dialogue_text, disallowed_special=())
+    if len(tokens) <= MAX_INPUT_TOKENS:
+        return dialogue_text
 
-    ### 1. 事件概述
-    用一句话高度概括整个事件的核心内容。
+    half = MAX_INPUT_TOKENS // 2
+    omitted = len(tokens) - 2 * half
+    return (
+        encoder.decode(tokens[:half])
+        + f"\n\n[...中间省略 {omitted} 个 token...]\n\n"
+        + encoder.decode(tokens[-half:])
+    )
 
-    ### 2. 问题时间线 (Timeline)
-    严格按照时间顺序，简洁列出每个关键且重要节点的人物和行为。
-    - **10:00 AM (小李):** 发现并报告了什么问题（附上关键日志）。
-    - **10:02~10:05 AM (老王):** 提出了初步的猜测。给出了具体的排查指令（如 `top` 命令）。
-    - **10:08 AM (小李):** 执行指令并反馈了什么关键信息（如 `top` 截图内容）。
-    - **...以此类推，直到问题解决。**
 
-    ### 3. 根本原因 (Root Cause Analysis)
-    一句话清晰、准确地指出导致问题的技术根本原因。
+# --- 长对话压缩 (LLMLingua-2) ---
+# 超过该字符数的对话在发送前先压缩，丢弃信息量低的 token 以减少输入 token
+COMPRESS_THRESHOLD = 4000
+COMPRESS_RATE = 0.5
+COMPRESS_MODEL = "microsoft/llmlingua-2-xlm-roberta-large-meetingbank"
+# 强制保留换行、冒号和时间标记，保证时间线部分不被压缩破坏
+# （不列出 "10:00" 这类具体时刻：它只能保住某一个时间点，冒号和 AM/PM 已覆盖所有时间戳的结构）
+COMPRESS_FORCE_TOKENS = ["\n", ":", "AM", "PM"]
 
-    ### 4. 解决方案
-    描述最终采用的技术解决方案以及由谁完成。
 
-    ### 5. 总结与反思
-    一句话提炼出本次事件的关键教训，以及未来可以如何改进以避免类似问题。
-    请确保你的报告完全基于以下提供的对话原文，保持客观，不要添加任何对话中未提及的信息。
-    请使用 Markdown 格式进行输出，确保格式清晰美观。不出现代码块，用空格+斜体代替。
+# 模型首次加载需要从 Hugging Face 下载数 GB 权重，显示提示以免页面看起来卡住
+@st.cache_resource(show_spinner="正在加载 LLMLingua-2 压缩模型（首次使用需下载，可能需要几分钟）...")
+def get_compressor():
+    """加载并缓存 LLMLingua-2 压缩模型，未安装 llmlingua 时返回 None"""
+    if PromptCompressor is None:
+        return None
+    return PromptCompressor(model_name=COMPRESS_MODEL, use_llmlingua2=True)
+
 
-    ---
-    【对话记录原文】
-    {dialogue}
-    ---
+def compress_dialogue(dialogue_text: str) -> str:
     """
+    对过长的对话进行压缩，短对话或压缩不可用时原样返回。
+
+    Args:
+        dialogue_text: 包含对话记录的字符串。
+
+    Returns:
+        压缩后（或原始）的对话文本。
+    """
+    if len(dialogue_text) <= COMPRESS_THRESHOLD:
+        return dialogue_text
+
+    compressor = get_compressor()
+    if compressor is None:
+        return dialogue_text
+
+    result = compressor.compress_prompt(
+        dialogue_text,
+        rate=COMPRESS_RATE,
+        force_tokens=COMPRESS_FORCE_TOKENS,
+    )
+    return result["compressed_prompt"]
+
+
+def prepare_dialogue(dialogue_text: str, n_tokens: int | None) -> str:
+    """发送前的预处理：先截断超长部分，再对长对话做压缩"""
+    return compress_dialogue(truncate_dialogue(dialogue_text, n_tokens))
+
+
+# 预处理版本号：报告取决于截断、压缩后的文本，任一预处理参数或压缩是否可用发生变化时，
+# 已落盘的响应缓存都应失效
+PREPROCESS_VERSION = hashlib.blake2b(
+    repr((
+        MAX_INPUT_TOKENS,
+        COMPRESS_THRESHOLD,
+        COMPRESS_RATE,
+        COMPRESS_MODEL,
+        COMPRESS_FORCE_TOKENS,
+        PromptCompressor is not None,
+    )).encode("utf-8"),
+    digest_size=8,
+).hexdigest()
+
+
+def _cache_key(dialogue_text: str, model_name: str) -> str:
+    """
+    根据模型参数、模板与预处理版本和对话内容计算响应缓存的键。
+
+    键只用于缓存查找，不涉及安全校验，因此优先使用非加密的 xxh3_128，
+    长对话的哈希开销远低于 blake2b；未安装 xxhash 时回退到 blake2b。
+    """
+    prefix = f"{model_name}|{TEMPERATURE}|{PROMPT_VERSION}|{PREPROCESS_VERSION}|".encode("utf-8")
+    h = xxhash.xxh3_128(prefix) if xxhash is not None else hashlib.blake2b(prefix, digest_size=16)
+    h.update(dialogue_text.encode("utf-8"))
+    return h.hexdigest()
+
+
+# 批量生成时同时发起的最大请求数
+BATCH_MAX_CONCURRENCY = 5
+
+# 响应缓存：优先落盘，重启或重新部署后仍可命中
+# 目录固定在 app.py 旁边，不受启动时工作目录影响（devcontainer 从仓库根目录启动）
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".summary_cache")
+CACHE_SIZE_LIMIT = 1 << 30  # 1 GiB
+CACHE_EXPIRE_SECONDS = 30 * 24 * 3600
+# 未安装 diskcache 时退回进程内字典，最多保留的报告数量
+CACHE_MAX_ENTRIES = 128
+
+
+@st.cache_resource(show_spinner=False)
+def _summary_cache():
+    """
+    所有会话共享的响应缓存：key -> 报告文本。
+
+    流式输出无法直接套用 st.cache_data，因此用 st.cache_resource 持有缓存对象，
+    在流结束后写入完整报告。安装了 diskcache 时缓存写入磁盘，进程重启后依然有效；
+    否则使用进程内字典，超过上限时按插入顺序淘汰最早的条目。
+    """
+    if diskcache is not None:
+        return diskcache.Cache(CACHE_DIR, size_limit=CACHE_SIZE_LIMIT)
+    return {}
+
+
+def _cache_put(key: str, summary: str) -> None:
+    """将报告写入响应缓存"""
+    cache = _summary_cache()
+    if diskcache is not None:
+        cache.set(key, summary, expire=CACHE_EXPIRE_SECONDS)
+        return
+    if len(cache) >= CACHE_MAX_ENTRIES:
+        cache.pop(next(iter(cache)), None)
+    cache[key] = summary
+
+
+def stream_summary(dialogue_text: str, n_tokens: int | None):
+    """
+    以流式方式生成总结报告，逐块产出文本，供 st.write_stream 使用。
+
+    相同的对话命中缓存时一次性产出已有报告，不再请求 API。
+    缓存键基于原始对话计算，命中时也省去了截断和压缩的开销。
+
+    Args:
+        dialogue_text: 包含对话记录的字符串。
+        n_tokens: 对话的 token 数（由调用方预先计算，无法计数时为 None）。
+
+    Yields:
+        报告的文本片段。
+    """
+    model_name = pick_model_for(n_tokens)
+    key = _cache_key(dialogue_text, model_name)
+    cached = _summary_cache().get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    chunks = []
+    for chunk in get_chain(model_name).stream({"dialogue": prepare_dialogue(dialogue_text, n_tokens)}):
+        chunks.append(chunk)
+        yield chunk
+    _cache_put(key, "".join(chunks))
+
+
+@st.cache_resource(show_spinner=False)
+def _event_loop() -> asyncio.AbstractEventLoop:
+    """
+    在后台线程中常驻一个事件循环。
+
+    ChatOpenAI 的异步 HTTP 连接池绑定在创建它的事件循环上，
+    每次都用 asyncio.run 新建循环会让缓存的客户端失效，因此所有异步调用都提交到这里执行。
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+
+def _run_async(coro):
+    """在常驻事件循环上执行协程，并阻塞等待其结果"""
+    return asyncio.run_coroutine_threadsafe(coro, _event_loop()).result()
 
-    # 创建 Prompt 模板实例
-    prompt = ChatPromptTemplate.from_template(prompt_template)
 
-    # 初始化 LLM 模型
-    # temperature=0.1 使得输出更稳定、可复现
-    llm = ChatOpenAI(temperature=0.1, model_name="gpt-4o-mini")
+async def _agenerate(dialogue: str, model_name: str, semaphore: asyncio.Semaphore) -> str:
+    """异步调用链生成单份报告，semaphore 限制同时进行的请求数"""
+    async with semaphore:
+        return await get_chain(model_name).ainvoke({"dialogue": dialogue})
 
-    # 创建 LLMChain，将 Prompt 和 LLM "链接" 在一起
-    chain = LLMChain(llm=llm, prompt=prompt)
 
-    # 执行链，并获取结果
+async def _agenerate_all(dialogues: list[str], model_names: list[str]) -> list:
+    """并发生成多份报告，结果与输入顺序一致，失败的位置为异常对象"""
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    return await asyncio.gather(
+        *[_agenerate(d, m, semaphore) for d, m in zip(dialogues, model_names)],
+        return_exceptions=True,
+    )
+
+
+def generate_summaries(dialogues: list[str], token_counts: list[int | None]) -> list[str]:
+    """
+    批量分析并总结多段对话，未命中缓存的对话通过 ainvoke 异步并发请求。
+
+    Args:
+        dialogues: 对话记录字符串列表。
+        token_counts: 各段对话的 token 数（由调用方预先计算），路由和截断共用。
+
+    Returns:
+        与输入顺序一一对应的报告列表，生成失败的位置为 None。
+    """
+    model_names = [pick_model_for(n) for n in token_counts]
+    keys = [_cache_key(d, m) for d, m in zip(dialogues, model_names)]
+    cache = _summary_cache()
+    summaries = [cache.get(k) for k in keys]
+
+    # 只对未命中缓存的对话发起请求；内容相同的对话只请求一次，记录每个 key 对应的所有下标
+    targets = {}
+    for i, summary in enumerate(summaries):
+        if summary is None:
+            targets.setdefault(keys[i], []).append(i)
+    pending = [indices[0] for indices in targets.values()]
+    if not pending:
+        return summaries
+
+    # 执行链，并获取结果；单个请求失败不影响其他对话
     try:
-        response = chain.invoke({"dialogue": dialogue_text})
-        # 返回结果中的文本部分
-        return response.get('text', '抱歉，未能生成报告。')
+        results = _run_async(_agenerate_all(
+            [prepare_dialogue(dialogues[i], token_counts[i]) for i in pending],
+            [model_names[i] for i in pending],
+        ))
     except Exception as e:
         st.error(f"调用 API 时出错: {e}")
-        return None
+        return summaries
+
+    # 按下标写回结果，gather 的返回顺序与 pending 一致；同一份结果分发给所有相同的对话
+    for i, result in zip(pending, results):
+        if isinstance(result, Exception):
+            st.error(f"调用 API 时出错 (第 {i + 1} 段对话): {result}")
+            continue
+        for j in targets[keys[i]]:
+            summaries[j] = result
+        _cache_put(keys[i], result)
+    return summaries
+
+
+# --- OpenAI Batch API (离线批处理，半价，24 小时内完成) ---
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+
+
+@st.cache_resource(show_spinner=False)
+def get_openai_client():
+    """创建并缓存原生 OpenAI 客户端，用于 Batch API 的文件上传和任务管理"""
+    return OpenAI()
+
+
+def submit_batch(dialogues: list[str], token_counts: list[int | None]) -> tuple[str, str]:
+    """
+    将多段对话作为一个 Batch 任务提交，按半价计费，结果异步返回。
+
+    Batch API 要求同一个输入文件只使用一个模型，因此按最长的对话为整批选择模型。
+
+    Args:
+        dialogues: 对话记录字符串列表，custom_id 为其在列表中的下标。
+        token_counts: 各段对话的 token 数（由调用方预先计算）。
+
+    Returns:
+        (Batch 任务 ID, 使用的模型)。
+    """
+    # 无法计数时（词表不可用）所有对话均为 None，回退到默认模型
+    model_name = pick_model_for(None if None in token_counts else max(token_counts))
+
+    lines = []
+    for i, (dialogue, n_tokens) in enumerate(zip(dialogues, token_counts)):
+        request = {
+            "custom_id": str(i),
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": model_name,
+                "temperature": TEMPERATURE,
+                "messages": [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": HUMAN_PROMPT.format(dialogue=prepare_dialogue(dialogue, n_tokens))},
+                ],
+            },
+        }
+        lines.append(json.dumps(request, ensure_ascii=False))
+
+    client = get_openai_client()
+    input_file = client.files.create(
+        file=("batch_input.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch",
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+    )
+    return batch.id, model_name
+
+
+def fetch_batch_results(batch_id: str, count: int) -> tuple[str, list[str] | None]:
+    """
+    查询 Batch 任务状态，完成后下载并解析结果。
+
+    Args:
+        batch_id: submit_batch 返回的任务 ID。
+        count: 提交时的对话数量。
+
+    Returns:
+        (任务状态, 报告列表)。任务未完成时报告列表为 None；
+        已完成时按提交顺序排列，失败的请求对应位置为 None。
+    """
+    client = get_openai_client()
+    batch = client.batches.retrieve(batch_id)
+    if batch.status != "completed":
+        return batch.status, None
+
+    summaries = [None] * count
+    if batch.output_file_id:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            summaries[int(record["custom_id"])] = response["body"]["choices"][0]["message"]["content"]
+    return batch.status, summaries
+
+
+def warm_up():
+    """
+    预先构建各模型的链。
+
+    链由 st.cache_resource 缓存，提前调用一次即可把初始化开销
+    从用户第一次点击按钮移到页面首次加载时，之后的调用都是字典查找。
+    tiktoken 编码器无需在此预热：输入区每次渲染都会调用 count_tokens。
+    """
+    for model_name in (SMALL_MODEL_NAME, MODEL_NAME, LARGE_MODEL_NAME):
+        get_chain(model_name)
 
 
 # --- 3. Streamlit 用户界面 ---
+# 示例文件与 app.py 放在一起，按脚本位置解析，不受启动时工作目录影响
+EXAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "conversation_example.txt")
+FAILED_SUMMARY = "报告生成失败，请检查 API Key 或网络。"
+
+
+@st.cache_data(show_spinner=False)
+def load_example(path: str, mtime: float) -> str:
+    """
+    读取示例对话文件。
+
+    mtime 参与缓存键：文件未修改时每次重跑直接命中缓存，文件被编辑后自动重新读取。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+# 上传文件依次尝试的编码：带/不带 BOM 的 UTF-8，以及 Windows 中文环境常见的 GBK（gb18030 是其超集）
+UPLOAD_ENCODINGS = ("utf-8-sig", "gb18030")
+
+
+def read_uploads(uploaded_files) -> tuple[list[str], list[str]]:
+    """
+    读取上传的对话文件，返回 (文件名列表, 对话内容列表)。
+
+    无法解码的文件和空文件会提示并跳过，不会发送给 API。
+    """
+    names, dialogues = [], []
+    for f in uploaded_files:
+        data = f.getvalue()
+        for encoding in UPLOAD_ENCODINGS:
+            try:
+                text = data.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            st.error(f"无法识别文件 {f.name} 的编码，请另存为 UTF-8 后重新上传。")
+            continue
+
+        if not text.strip():
+            st.warning(f"文件 {f.name} 内容为空，已跳过。")
+            continue
+        names.append(f.name)
+        dialogues.append(text)
+    return names, dialogues
+
+
+def count_uploads(names: list[str], dialogues: list[str]) -> list[int | None]:
+    """计算各上传文件的 token 数，超过上限的文件逐个提示将被省略中间部分"""
+    token_counts = [count_tokens(d) for d in dialogues]
+    for name, n_tokens in zip(names, token_counts):
+        if n_tokens is not None and n_tokens > MAX_INPUT_TOKENS:
+            st.warning(f"文件 {name} 约 {n_tokens:,} tokens，超过 {MAX_INPUT_TOKENS:,} 上限，已省略中间部分后提交。")
+    return token_counts
+
+
+def format_reports(names: list[str], summaries: list[str]) -> str:
+    """按文件顺序拼接多份报告，每份以文件名作为标题"""
+    return "\n\n---\n\n".join(
+        f"## 📄 {name}\n\n{summary or FAILED_SUMMARY}"
+        for name, summary in zip(names, summaries)
+    )
+
+
+@st.fragment
+def _result_panel(dialogue_input: str, input_tokens: int | None, uploaded_files):
+    """
+    右侧的报告区：生成按钮、Batch 任务和报告展示。
+
+    Args:
+        dialogue_input: 文本框中的对话记录。
+        input_tokens: 对话记录的 token 数，无法计数时为 None。
+        uploaded_files: 上传的对话文件列表。
+    """
+    st.subheader("✨ AI 生成的复盘报告")
+
+    if 'summary' not in st.session_state:
+        st.session_state.summary = "点击左侧按钮开始生成报告..."
+
+    # 本次重跑中报告是否已通过流式输出渲染
+    streamed = False
+
+    if st.button("🚀 生成总结报告", type="primary", use_container_width=True):
+        if uploaded_files:
+            # 多个文件并发生成，按上传顺序拼接各自的报告
+            names, dialogues = read_uploads(uploaded_files)
+            if dialogues:
+                token_counts = count_uploads(names, dialogues)
+                with st.spinner(f"AI 正在并发分析 {len(dialogues)} 段对话，请稍候..."):
+                    summaries = generate_summaries(dialogues, token_counts)
+                st.session_state.summary = format_reports(names, summaries)
+        elif not dialogue_input.strip():
+            st.warning("请输入对话内容！")
+        else:
+            if input_tokens is not None and input_tokens > MAX_INPUT_TOKENS:
+                st.warning(f"对话约 {input_tokens:,} tokens，超过 {MAX_INPUT_TOKENS:,} 上限，已省略中间部分后提交。")
+            # 逐块渲染模型输出，首个 token 到达即可看到报告
+            try:
+                st.session_state.summary = st.write_stream(stream_summary(dialogue_input, input_tokens))
+                streamed = True
+            except Exception as e:
+                st.error(f"调用 API 时出错: {e}")
+                st.session_state.summary = FAILED_SUMMARY
+
+    # 不需要即时结果的多文件任务可以走 Batch API，费用减半，24 小时内完成
+    if st.button("📦 Batch 异步提交（半价）", use_container_width=True, disabled=not uploaded_files):
+        names, dialogues = read_uploads(uploaded_files)
+        if dialogues:
+            token_counts = count_uploads(names, dialogues)
+            try:
+                st.session_state.batch_id, st.session_state.batch_model = submit_batch(dialogues, token_counts)
+                st.session_state.batch_names = names
+                st.success(f"已提交 Batch 任务：{st.session_state.batch_id}（模型 {st.session_state.batch_model}）")
+            except Exception as e:
+                st.error(f"提交 Batch 任务时出错: {e}")
+
+    if 'batch_id' in st.session_state:
+        if st.button("🔄 查询 Batch 状态", use_container_width=True):
+            names = st.session_state.batch_names
+            try:
+                status, summaries = fetch_batch_results(st.session_state.batch_id, len(names))
+                if status in ("failed", "expired", "cancelled"):
+                    st.error(f"Batch 任务 {st.session_state.batch_id} 未能完成，状态：{status}")
+                    del st.session_state.batch_id
+                elif summaries is None:
+                    st.info(f"Batch 任务 {st.session_state.batch_id}（模型 {st.session_state.batch_model}）当前状态：{status}")
+                else:
+                    st.session_state.summary = format_reports(names, summaries)
+                    del st.session_state.batch_id
+            except Exception as e:
+                st.error(f"查询 Batch 任务时出错: {e}")
+
+    # 使用 Markdown 组件展示报告，并设置边框和内边距
+    if not streamed:
+        st.markdown(f'{st.session_state.summary}', unsafe_allow_html=True)
+
+
 def main():
     st.set_page_config(page_title="What Happened Today", page_icon="❓", layout="wide")
     check_api_key()
+    # API Key 就绪后才能创建 ChatOpenAI，因此预热放在检查之后
+    warm_up()
 
     st.title("?What Happened Today")
     st.caption("—— Powered by LangChain & Streamlit")
@@ -102,8 +673,8 @@ def main():
     with col1:
         st.subheader("📋 原始对话记录")
         try:
-            with open("conversation_example.txt", "r", encoding="utf-8") as f:
-                example_text = f.read()
+            mtime = os.path.getmtime(EXAMPLE_PATH)
+            example_text = load_example(EXAMPLE_PATH, mtime)
         except FileNotFoundError:
             example_text = "示例文件 (conversation_example.txt) 未找到。"
 
@@ -113,26 +684,20 @@ def main():
             height=500,
             label_visibility="collapsed"
         )
+        input_tokens = count_tokens(dialogue_input)
+        if input_tokens is not None:
+            st.caption(f"约 {input_tokens:,} tokens（上限 {MAX_INPUT_TOKENS:,}），将使用 {pick_model_for(input_tokens)}")
+
+        uploaded_files = st.file_uploader(
+            "或上传多个对话记录文件（上传后将批量生成报告）:",
+            type=["txt", "md"],
+            accept_multiple_files=True,
+        )
 
     with col2:
-        st.subheader("✨ AI 生成的复盘报告")
-
-        if 'summary' not in st.session_state:
-            st.session_state.summary = "点击左侧按钮开始生成报告..."
-
-        if st.button("🚀 生成总结报告", type="primary", use_container_width=True):
-            if not dialogue_input.strip():
-                st.warning("请输入对话内容！")
-            else:
-                with st.spinner("AI 正在深度分析中，请稍候..."):
-                    summary_output = generate_summary(dialogue_input)
-                    if summary_output:
-                        st.session_state.summary = summary_output
-                    else:
-                        st.session_state.summary = "报告生成失败，请检查 API Key 或网络。"
-
-        # 使用 Markdown 组件展示报告，并设置边框和内边距
-        st.markdown(f'{st.session_state.summary}', unsafe_allow_html=True)
+        # 结果区是独立的 fragment：点击按钮只重跑这一列，左侧输入区和页面其余部分不会重新执行
+        _result_panel(dialogue_input, input_tokens, uploaded_files)
+
 
 if __name__ == "__main__":
     main()